@@ -1,14 +1,331 @@
 import boto3
 import paramiko
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 import json
 import io
+import mmap
 import os
-import gzip
 import re
-from typing import List, Dict, Tuple
+import queue
+import socket
+import struct
+import time
+import traceback
+import zipfile
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, List, Dict, Optional, Tuple
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime
 import shutil
 
+# Number of file groups processed concurrently
+MAX_WORKERS = 8
+
+# Concurrent part uploads per staged file. Every worker may upload at once, so
+# the S3 client's connection pool is sized to cover all of their threads.
+S3_UPLOAD_CONCURRENCY = 4
+S3_MAX_POOL_CONNECTIONS = MAX_WORKERS * S3_UPLOAD_CONCURRENCY
+
+# Clients and the parsed SSH key live at module scope so they are reused
+# across warm invocations of the same Lambda container
+_S3 = boto3.client('s3', config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS))
+_SECRETS = boto3.client('secretsmanager')
+_SECRET_CACHE = None
+_PKEY_CACHE = None
+
+# Outstanding SFTP read requests per download, matching OpenSSH's default.
+# Keep this bounded: an unbounded prefetch queues every block of the file at
+# once and can stall against servers that limit in-flight requests.
+SFTP_PREFETCH_REQUESTS = 64
+
+# Socket buffer size for SFTP connections, large enough to cover the
+# bandwidth-delay product of high-latency links. Only applied where the
+# kernel would not clamp it below what TCP autotuning reaches on its own.
+SOCKET_BUFFER_SIZE = 32 * 1024 * 1024
+
+# [part_]YYYYMMDD_name.(zip|csv)
+FILENAME_PATTERN = re.compile(r'^(?:(\d+)_)?(\d{8})_(.+?)(?:\.zip|\.csv)$')
+
+# Staging area for groups that must touch local disk; each such group gets
+# its own subdirectory, created up front and removed when the group finishes
+WORK_ROOT = '/tmp/work'
+
+# Chunk size for local file copies
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Gzipped files larger than this are rejected
+MAX_GZIP_SIZE = 250 * 1024 * 1024
+
+# S3 multipart part size; every part except the last must be at least 5 MB
+S3_PART_SIZE = 8 * 1024 * 1024
+
+# Parallel gzip: input is split into blocks that are deflated on separate
+# threads, each primed with the last 32 KB of the block before it
+GZIP_LEVEL = 6
+DEFLATE_BLOCK_SIZE = 128 * 1024
+DEFLATE_DICT_SIZE = 32 * 1024
+
+@lru_cache(maxsize=None)
+def socket_buffer_options() -> Tuple[Tuple[int, int], ...]:
+    """Return the SO_SNDBUF/SO_RCVBUF settings worth applying on this host.
+
+    On Linux, setting a buffer size disables TCP autotuning for that
+    direction, and the kernel clamps the request to twice
+    net.core.wmem_max/rmem_max (about 416 KB on Lambda). A fixed size is only
+    used when the clamped value beats the autotuning ceiling in
+    net.ipv4.tcp_wmem/tcp_rmem; otherwise autotuning is left alone.
+    """
+    options = []
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        for option, sysctl in ((socket.SO_SNDBUF, 'tcp_wmem'), (socket.SO_RCVBUF, 'tcp_rmem')):
+            probe.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER_SIZE)
+            effective = probe.getsockopt(socket.SOL_SOCKET, option)
+            try:
+                with open(f'/proc/sys/net/ipv4/{sysctl}') as f:
+                    autotune_max = int(f.read().split()[2])
+            except (OSError, ValueError, IndexError):
+                # No autotuning limits to compare against (not Linux)
+                autotune_max = 0
+            if effective > autotune_max:
+                options.append((option, SOCKET_BUFFER_SIZE))
+    finally:
+        probe.close()
+    return tuple(options)
+
+def open_tuned_socket(host: str, port: int = 22) -> socket.socket:
+    """Open a TCP connection with Nagle disabled and, where it helps, large buffers.
+
+    Tries each address from getaddrinfo in turn, like socket.create_connection,
+    so IPv6-only hosts still work.
+    """
+    error = None
+    for family, socktype, proto, _, address in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Buffers must be sized before connect() so the window scale is negotiated
+            for option, size in socket_buffer_options():
+                sock.setsockopt(socket.SOL_SOCKET, option, size)
+            sock.connect(address)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+        except BaseException:
+            sock.close()
+            raise
+    if error is None:
+        error = OSError(f"getaddrinfo returned no addresses for {host}")
+    raise error
+
+def deflate_block(block, zdict) -> bytes:
+    """Raw-deflate one block, ending on a byte boundary so blocks can be concatenated."""
+    if zdict is None:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def write_gzip(chunks: Iterable[bytes], f_out, filename: str = ''):
+    """Gzip a stream of byte chunks into f_out using all CPUs, pigz-style.
+
+    zlib releases the GIL while compressing, so blocks deflate in parallel on
+    a thread pool; their outputs are written in order behind a single gzip
+    header and followed by the CRC32/size trailer.
+    """
+    try:
+        _write_gzip(chunks, f_out, filename)
+    except BaseException as e:
+        # The traceback's frames still hold slices of the input (pending
+        # blocks, the dictionary, the current chunk); drop them so callers
+        # can release the underlying buffer, e.g. close an mmap
+        traceback.clear_frames(e.__traceback__)
+        raise
+
+def _write_gzip(chunks: Iterable[bytes], f_out, filename: str):
+    workers = os.cpu_count() or 1
+    if workers == 1:
+        # wbits=31 makes zlib write the gzip header and trailer itself
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            f_out.write(compressor.compress(chunk))
+        f_out.write(compressor.flush())
+        return
+
+    # Header layout matches gzip.GzipFile, including the original filename
+    fname = os.path.basename(filename)
+    if fname.endswith('.gz'):
+        fname = fname[:-3]
+    fname = fname.encode('latin-1', 'replace')
+    f_out.write(b'\x1f\x8b\x08' + (b'\x08' if fname else b'\x00'))
+    f_out.write(struct.pack('<L', int(time.time())) + b'\x00\xff')
+    if fname:
+        f_out.write(fname + b'\x00')
+
+    crc = 0
+    size = 0
+    zdict = None
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunks:
+            view = memoryview(chunk)
+            for start in range(0, len(view), DEFLATE_BLOCK_SIZE):
+                block = view[start:start + DEFLATE_BLOCK_SIZE]
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+                pending.append(executor.submit(deflate_block, block, zdict))
+                zdict = block[-DEFLATE_DICT_SIZE:]
+                # Bound the number of blocks held in memory
+                if len(pending) >= 2 * workers:
+                    f_out.write(pending.popleft().result())
+        while pending:
+            f_out.write(pending.popleft().result())
+
+    # An empty final block terminates the deflate stream
+    f_out.write(zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS).flush())
+    f_out.write(struct.pack('<LL', crc, size & 0xffffffff))
+
+class SftpConnectionPool:
+    """Pool of authenticated SFTP connections that can be grown on demand."""
+
+    def __init__(self, host: str, username: str, pkey: paramiko.PKey, size: int = 1):
+        self.host = host
+        self.username = username
+        self.pkey = pkey
+        self._connections = queue.Queue()
+        self._transports = []
+        try:
+            self.grow(size)
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self) -> Tuple[paramiko.Transport, paramiko.SFTPClient]:
+        transport = paramiko.Transport(open_tuned_socket(self.host))
+        try:
+            transport.connect(username=self.username, pkey=self.pkey)
+            sftp_client = paramiko.SFTPClient.from_transport(transport)
+        except Exception:
+            transport.close()
+            raise
+        return transport, sftp_client
+
+    def grow(self, size: int):
+        """Open connections in parallel until the pool holds size of them."""
+        missing = size - self.size
+        if missing <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            futures = [executor.submit(self._open) for _ in range(missing)]
+        error = None
+        for future in futures:
+            try:
+                transport, sftp_client = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            self._transports.append(transport)
+            self._connections.put((transport, sftp_client))
+        if error:
+            raise error
+
+    @property
+    def size(self) -> int:
+        """Number of open connections in the pool."""
+        return len(self._transports)
+
+    @contextmanager
+    def client(self):
+        """Borrow an SFTP client from the pool for the duration of the block."""
+        transport, sftp_client = self._connections.get()
+        try:
+            yield sftp_client
+        finally:
+            self._connections.put((transport, sftp_client))
+
+    def close(self):
+        """Close all pooled SFTP connections."""
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+class S3MultipartWriter:
+    """Write-only file object that streams its contents to an S3 multipart upload.
+
+    Used as a context manager: the upload is completed on a clean exit and
+    aborted if the block raises.
+    """
+
+    def __init__(self, s3_client, bucket: str, s3_key: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.s3_key = s3_key
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._parts = []
+        response = s3_client.create_multipart_upload(Bucket=bucket, Key=s3_key)
+        self._upload_id = response['UploadId']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # Let the original error propagate even if the abort fails too, e.g.
+        # when the role lacks s3:AbortMultipartUpload
+        try:
+            self.abort()
+        except Exception as e:
+            print(f"Error aborting multipart upload for {self.s3_key}: {str(e)}")
+
+    def write(self, data) -> int:
+        self.bytes_written += len(data)
+        if self.bytes_written > MAX_GZIP_SIZE:
+            raise ValueError(f"Gzipped file {self.s3_key} exceeds 250MB limit")
+        self._buffer += data
+        if len(self._buffer) >= S3_PART_SIZE:
+            self._upload_part()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _upload_part(self):
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.s3_key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(self._buffer),
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self._buffer = bytearray()
+
+    def close(self):
+        """Upload any buffered data and complete the multipart upload."""
+        if self._buffer or not self._parts:
+            self._upload_part()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.s3_key,
+            UploadId=self._upload_id,
+            MultipartUpload={'Parts': self._parts},
+        )
+
+    def abort(self):
+        """Abort the multipart upload, discarding any uploaded parts."""
+        self.s3_client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.s3_key, UploadId=self._upload_id
+        )
+
 class FileProcessor:
     def __init__(self):
         # Get configuration from environment variables
@@ -17,36 +334,53 @@ class FileProcessor:
         self.secret_arn = os.environ['SECRET_ARN']
         self.s3_bucket = os.environ['S3_BUCKET']
         
-        self.sftp_client = None
-        self.transport = None
-        self.local_temp_dir = '/tmp'
-        self.s3_client = boto3.client('s3')
+        self.sftp_pool = None
+        self.s3_client = _S3
+        self.transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=16 * 1024 * 1024,
+            max_concurrency=S3_UPLOAD_CONCURRENCY,
+            use_threads=True,
+        )
         
     def get_secret(self) -> Dict:
-        """Retrieve SSH key from Secrets Manager."""
-        client = boto3.client('secretsmanager')
-        response = client.get_secret_value(SecretId=self.secret_arn)
-        return json.loads(response['SecretString'])
-
-    def connect_sftp(self):
-        """Establish SFTP connection."""
-        secret = self.get_secret()
-        ssh_key = paramiko.RSAKey(file_obj=io.StringIO(secret['SSH_KEY']))
-        self.transport = paramiko.Transport((self.sftp_host, 22))
-        self.transport.connect(username=self.sftp_username, pkey=ssh_key)
-        self.sftp_client = paramiko.SFTPClient.from_transport(self.transport)
+        """Retrieve SSH key from Secrets Manager, once per container."""
+        global _SECRET_CACHE
+        if _SECRET_CACHE is None:
+            response = _SECRETS.get_secret_value(SecretId=self.secret_arn)
+            _SECRET_CACHE = json.loads(response['SecretString'])
+        return _SECRET_CACHE
+
+    def get_ssh_key(self) -> paramiko.PKey:
+        """Return the parsed SSH key, once per container."""
+        global _PKEY_CACHE
+        if _PKEY_CACHE is None:
+            _PKEY_CACHE = paramiko.RSAKey(file_obj=io.StringIO(self.get_secret()['SSH_KEY']))
+        return _PKEY_CACHE
+
+    def clear_secret_cache(self):
+        """Forget the cached secret so the next lookup fetches it again."""
+        global _SECRET_CACHE, _PKEY_CACHE
+        _SECRET_CACHE = None
+        _PKEY_CACHE = None
+
+    def connect_sftp(self, pool_size: int = 1):
+        """Establish a pool of SFTP connections; grow it once the work is known."""
+        try:
+            self.sftp_pool = SftpConnectionPool(self.sftp_host, self.sftp_username, self.get_ssh_key(), pool_size)
+        except paramiko.AuthenticationException:
+            # The cached key may have been rotated; fetch it again once
+            self.clear_secret_cache()
+            self.sftp_pool = SftpConnectionPool(self.sftp_host, self.sftp_username, self.get_ssh_key(), pool_size)
 
     def close_sftp(self):
-        """Close SFTP connection."""
-        if self.sftp_client:
-            self.sftp_client.close()
-        if self.transport:
-            self.transport.close()
+        """Close SFTP connections."""
+        if self.sftp_pool:
+            self.sftp_pool.close()
 
     def parse_filename(self, filename: str) -> Dict:
         """Parse filename to extract components."""
-        pattern = r'^(?:(\d+)_)?(\d{8})_(.+?)(?:\.zip|\.csv)$'
-        match = re.match(pattern, filename)
+        match = FILENAME_PATTERN.match(filename)
         if not match:
             return None
         
@@ -59,99 +393,177 @@ class FileProcessor:
             'full_name': filename
         }
 
-    def group_files(self, files: List[str]) -> Dict:
+    def group_files(self, entries: List[paramiko.SFTPAttributes]) -> Dict:
         """Group files by date and base name, identifying multi-part files."""
-        grouped_files = {}
-        for file in files:
-            parsed = self.parse_filename(file)
+        grouped_files = defaultdict(list)
+        for entry in entries:
+            parsed = self.parse_filename(entry.filename)
             if not parsed:
                 continue
+            # paramiko leaves st_size as None when the server omits it
+            parsed['size'] = entry.st_size or 0
                 
             key = f"{parsed['date']}_{parsed['base_name']}"
-            if key not in grouped_files:
-                grouped_files[key] = []
             grouped_files[key].append(parsed)
             
-        return grouped_files
+        return dict(grouped_files)
 
     def download_file(self, remote_path: str, local_path: str):
         """Download file from SFTP server."""
-        self.sftp_client.get(remote_path, local_path)
+        with self.sftp_pool.client() as sftp_client:
+            sftp_client.get(
+                remote_path,
+                local_path,
+                prefetch=True,
+                max_concurrent_prefetch_requests=SFTP_PREFETCH_REQUESTS,
+            )
+
+    def iter_remote_chunks(self, sftp_client: paramiko.SFTPClient, remote_files: List[Tuple[str, int]]):
+        """Yield the contents of remote files in order, one chunk at a time."""
+        for remote_path, size in remote_files:
+            with sftp_client.open(remote_path, 'rb') as remote_file:
+                # Sizes come from listdir_attr, sparing a stat per file; a size
+                # of 0 may mean the server omitted it, so let paramiko stat then
+                remote_file.prefetch(file_size=size or None, max_concurrent_requests=SFTP_PREFETCH_REQUESTS)
+                yield from iter(lambda: remote_file.read(COPY_BUFFER_SIZE), b'')
+
+    def stream_to_s3(self, remote_files: List[Tuple[str, int]], s3_key: str):
+        """Concatenate remote files, given as (name, size) pairs, and gzip them straight into an S3 object."""
+        with self.sftp_pool.client() as sftp_client:
+            with S3MultipartWriter(self.s3_client, self.s3_bucket, s3_key) as s3_file:
+                write_gzip(self.iter_remote_chunks(sftp_client, remote_files), s3_file, s3_key)
 
-    def unzip_file(self, zip_path: str, extract_path: str) -> str:
-        """Unzip file and return path to unzipped file."""
-        import zipfile  # Import here to ensure we're using Python's zipfile, not paramiko's
-        output_path = os.path.splitext(zip_path)[0]
+    def unzip_and_gzip(self, zip_path: str, output_path: str):
+        """Gzip the file inside a zip archive without extracting it to disk."""
+        # Archives are expected to hold a single file named after the archive
+        expected_name = os.path.basename(os.path.splitext(zip_path)[0])
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
-        return output_path
+            names = [info.filename for info in zip_ref.infolist() if not info.is_dir()]
+            if not names:
+                raise ValueError(f"Zip file {zip_path} is empty")
+            member = expected_name if expected_name in names else names[0]
+            with zip_ref.open(member) as zip_in, open(output_path, 'wb') as f_out:
+                write_gzip(iter(lambda: zip_in.read(COPY_BUFFER_SIZE), b''), f_out, output_path)
+        self.check_gzip_size(output_path)
 
-    def merge_files(self, file_paths: List[str], output_path: str):
-        """Merge multiple files into one."""
-        with open(output_path, 'wb') as outfile:
-            for file_path in sorted(file_paths):
-                with open(file_path, 'rb') as infile:
-                    shutil.copyfileobj(infile, outfile)
+    def iter_local_chunks(self, file_paths: List[str]):
+        """Yield the contents of local files in order, one chunk at a time."""
+        for file_path in file_paths:
+            with open(file_path, 'rb', buffering=0) as infile:
+                yield from iter(lambda: infile.read(COPY_BUFFER_SIZE), b'')
+
+    def check_gzip_size(self, gzipped_path: str):
+        """Raise if a gzipped file exceeds the size limit."""
+        if os.path.getsize(gzipped_path) > MAX_GZIP_SIZE:
+            raise ValueError(f"Gzipped file {gzipped_path} exceeds 250MB limit")
+
+    def merge_and_gzip(self, file_paths: List[str], output_path: str):
+        """Merge multiple files into one gzipped file in a single pass."""
+        with open(output_path, 'wb') as f_out:
+            write_gzip(self.iter_local_chunks(sorted(file_paths)), f_out, output_path)
+        self.check_gzip_size(output_path)
+
+    def iter_mapped_chunks(self, mm: mmap.mmap):
+        """Yield zero-copy slices of a memory-mapped file, one chunk at a time."""
+        view = memoryview(mm)
+        for start in range(0, len(view), COPY_BUFFER_SIZE):
+            yield view[start:start + COPY_BUFFER_SIZE]
 
     def gzip_file(self, input_path: str, output_path: str):
         """Gzip file and ensure it doesn't exceed size limit."""
-        with open(input_path, 'rb') as f_in:
-            with gzip.open(output_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+        # Map the input so compression reads straight from the page cache
+        # rather than copying it into Python buffers with read()
+        with open(input_path, 'rb') as f_in, open(output_path, 'wb') as f_out:
+            if os.fstat(f_in.fileno()).st_size == 0:
+                # Empty files cannot be mapped
+                write_gzip((), f_out, output_path)
+            else:
+                with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    chunks = self.iter_mapped_chunks(mm)
+                    try:
+                        write_gzip(chunks, f_out, output_path)
+                    finally:
+                        # Drop the generator's view before the map is closed
+                        chunks.close()
                 
         # Check if gzipped file exceeds 250MB
-        if os.path.getsize(output_path) > 250 * 1024 * 1024:
-            raise ValueError(f"Gzipped file {output_path} exceeds 250MB limit")
+        self.check_gzip_size(output_path)
 
     def upload_to_s3(self, local_path: str, bucket: str, s3_key: str):
         """Upload file to S3."""
-        self.s3_client.upload_file(local_path, bucket, s3_key)
+        self.s3_client.upload_file(local_path, bucket, s3_key, Config=self.transfer_config)
+
+    def needs_staging(self, file_group: List[Dict]) -> bool:
+        """Whether a group must be downloaded to local disk before processing.
+
+        Zip archives need random access, so only groups containing them are
+        staged; everything else streams from SFTP straight into S3.
+        """
+        return any(f['is_zip'] for f in file_group)
 
-    def process_file_group(self, group_key: str, file_group: List[Dict]) -> List[str]:
-        """Process a group of related files."""
+    def process_file_group(self, group_key: str, file_group: List[Dict], work_dir: Optional[str] = None) -> List[str]:
+        """Process a group of related files.
+
+        Groups that need staging are downloaded into work_dir, which the
+        caller must create beforehand; it is removed when the group finishes.
+        """
         processed_files = []
-        work_dir = f"{self.local_temp_dir}/{group_key}"
+        
+        # Plain CSVs are streamed from SFTP through gzip into S3 without
+        # touching local disk; zip archives still need to be staged in /tmp
+        if not self.needs_staging(file_group):
+            if any(f['part_num'] for f in file_group):
+                s3_key = f"{group_key}.csv.gz"
+                self.stream_to_s3(sorted((f['full_name'], f['size']) for f in file_group), s3_key)
+                processed_files.append(s3_key)
+            else:
+                # Independent CSVs, most commonly a single file, each get their own object
+                for file_info in file_group:
+                    s3_key = f"{file_info['full_name']}.gz"
+                    self.stream_to_s3([(file_info['full_name'], file_info['size'])], s3_key)
+                    processed_files.append(s3_key)
+            return processed_files
+        
+        if work_dir is None:
+            raise ValueError(f"Group {group_key} contains zip files and needs a work directory")
         
         try:
-            os.makedirs(work_dir, exist_ok=True)
-            
             # Download all files in group
             local_files = []
             for file_info in file_group:
                 local_path = os.path.join(work_dir, file_info['full_name'])
                 self.download_file(file_info['full_name'], local_path)
                 local_files.append(local_path)
-            
-            # Handle multi-part files
+
+            # Multi-part files are merged and gzipped in a single pass
             if any(f['part_num'] for f in file_group):
-                merged_path = os.path.join(work_dir, f"{group_key}.csv")
-                self.merge_files(local_files, merged_path)
-                local_files = [merged_path]
-            
-            # Handle zip files
-            final_files = []
-            for local_file in local_files:
-                if local_file.endswith('.zip'):
-                    unzipped_path = self.unzip_file(local_file, work_dir)
-                    final_files.append(unzipped_path)
-                else:
-                    final_files.append(local_file)
-            
-            # Gzip and upload each file
-            for file_path in final_files:
-                gzipped_path = f"{file_path}.gz"
-                self.gzip_file(file_path, gzipped_path)
-                
-                # Upload to S3
+                gzipped_path = os.path.join(work_dir, f"{group_key}.csv.gz")
+                self.merge_and_gzip(local_files, gzipped_path)
+                gzipped_files = [gzipped_path]
+            else:
+                # Zip members are decompressed straight into gzip
+                gzipped_files = []
+                for local_file in local_files:
+                    if local_file.endswith('.zip'):
+                        gzipped_path = f"{os.path.splitext(local_file)[0]}.gz"
+                        self.unzip_and_gzip(local_file, gzipped_path)
+                    else:
+                        gzipped_path = f"{local_file}.gz"
+                        self.gzip_file(local_file, gzipped_path)
+                    gzipped_files.append(gzipped_path)
+
+            # Upload to S3
+            for gzipped_path in gzipped_files:
                 s3_key = os.path.basename(gzipped_path)
                 self.upload_to_s3(gzipped_path, self.s3_bucket, s3_key)
                 processed_files.append(s3_key)
-                
         finally:
-            # Cleanup temporary files
-            if os.path.exists(work_dir):
-                shutil.rmtree(work_dir)
-                
+            # Free this group's disk space as soon as it finishes; the handler
+            # sweeps WORK_ROOT at the end as a backstop
+            shutil.rmtree(work_dir, ignore_errors=True)
+        
         return processed_files
 
 def lambda_handler(event, context):
@@ -170,19 +582,51 @@ def lambda_handler(event, context):
         # Connect to SFTP
         processor.connect_sftp()
         
-        # List files on SFTP server
-        files = processor.sftp_client.listdir('.')
-        grouped_files = processor.group_files(files)
+        # List files on SFTP server, with their sizes, in a single request
+        with processor.sftp_pool.client() as sftp_client:
+            entries = sftp_client.listdir_attr('.')
+        grouped_files = processor.group_files(entries)
         
-        # Process each group of files
-        for group_key, file_group in grouped_files.items():
-            try:
-                processed_files = processor.process_file_group(group_key, file_group)
-                all_processed_files.extend(processed_files)
-            except Exception as e:
-                error_msg = f"Error processing group {group_key}: {str(e)}"
-                print(error_msg)
-                processing_errors.append(error_msg)
+        # Only open as many connections as there are groups to work on. Servers
+        # that cap sessions per user may refuse some; carry on with those that
+        # opened, since the pool already holds at least one.
+        try:
+            processor.sftp_pool.grow(min(MAX_WORKERS, len(grouped_files)))
+        except Exception as e:
+            print(f"Continuing with {processor.sftp_pool.size} SFTP connection(s): {str(e)}")
+        
+        # Process groups of files concurrently, largest first, so the longest
+        # transfers start early instead of trailing behind the small ones
+        ordered_groups = sorted(
+            grouped_files.items(),
+            key=lambda item: sum(f['size'] for f in item[1]),
+            reverse=True,
+        )
+        
+        # Create work directories for groups that need staging in one pass
+        shutil.rmtree(WORK_ROOT, ignore_errors=True)
+        os.mkdir(WORK_ROOT)
+        work_dirs = {}
+        for index, (group_key, file_group) in enumerate(ordered_groups):
+            if processor.needs_staging(file_group):
+                work_dirs[group_key] = os.path.join(WORK_ROOT, f"wg{index}")
+                os.mkdir(work_dirs[group_key])
+        
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    processor.process_file_group, group_key, file_group, work_dirs.get(group_key)
+                ): group_key
+                for group_key, file_group in ordered_groups
+            }
+            for future in as_completed(futures):
+                group_key = futures[future]
+                try:
+                    all_processed_files.extend(future.result())
+                except Exception as e:
+                    error_msg = f"Error processing group {group_key}: {str(e)}"
+                    print(error_msg)
+                    processing_errors.append(error_msg)
                 
     except Exception as e:
         error_msg = f"Error in lambda execution: {str(e)}"
@@ -190,6 +634,8 @@ def lambda_handler(event, context):
         processing_errors.append(error_msg)
         raise
     finally:
+        # Backstop for anything a group could not clean up itself
+        shutil.rmtree(WORK_ROOT, ignore_errors=True)
         processor.close_sftp()
     
     return {
@@ -0,0 +1,365 @@
+import contextlib
+import errno
+import gzip
+import io
+import os
+import socket
+import sys
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+# The module creates its AWS clients at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_function
+
+ENV = {'SFTP_HOST': 'sftp.example.com', 'SFTP_USERNAME': 'user', 'SECRET_ARN': 'arn', 'S3_BUCKET': 'bucket'}
+
+
+class OpenTunedSocketTest(unittest.TestCase):
+    def connect(self, family, host):
+        with socket.create_server((host, 0), family=family) as server:
+            sock = lambda_function.open_tuned_socket(host, server.getsockname()[1])
+            with sock:
+                self.assertEqual(sock.family, family)
+                self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+    def test_ipv4(self):
+        self.connect(socket.AF_INET, '127.0.0.1')
+
+    @unittest.skipUnless(socket.has_ipv6, 'IPv6 not available')
+    def test_ipv6(self):
+        self.connect(socket.AF_INET6, '::1')
+
+    def test_connection_refused(self):
+        with socket.create_server(('127.0.0.1', 0)) as server:
+            port = server.getsockname()[1]
+        with self.assertRaises(ConnectionRefusedError):
+            lambda_function.open_tuned_socket('127.0.0.1', port)
+
+
+class SftpConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(lambda_function, 'open_tuned_socket'),
+            mock.patch.object(lambda_function.paramiko, 'Transport'),
+            mock.patch.object(lambda_function.paramiko.SFTPClient, 'from_transport'),
+        ]
+        self.open_socket, self.transport, _ = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def test_grow(self):
+        pool = lambda_function.SftpConnectionPool('host', 'user', 'key')
+        self.assertEqual(self.open_socket.call_count, 1)
+        pool.grow(4)
+        self.assertEqual(self.open_socket.call_count, 4)
+        pool.grow(2)
+        self.assertEqual(self.open_socket.call_count, 4)
+        pool.close()
+        self.assertEqual(self.transport.return_value.close.call_count, 4)
+
+    def test_grow_failure_keeps_opened_connections(self):
+        pool = lambda_function.SftpConnectionPool('host', 'user', 'key')
+        self.transport.return_value.connect.side_effect = [None, OSError('refused')]
+        with self.assertRaises(OSError):
+            pool.grow(3)
+        with pool.client():
+            pass
+        pool.close()
+
+
+class S3MultipartWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.s3_client = mock.Mock()
+        self.s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-id'}
+        self.s3_client.upload_part.side_effect = lambda PartNumber, **kwargs: {'ETag': f'etag-{PartNumber}'}
+
+    def test_splits_into_parts(self):
+        with mock.patch.object(lambda_function, 'S3_PART_SIZE', 10):
+            with lambda_function.S3MultipartWriter(self.s3_client, 'bucket', 'key.csv.gz') as s3_file:
+                s3_file.write(b'a' * 12)
+                s3_file.write(b'b' * 4)
+                s3_file.write(b'c' * 8)
+                s3_file.write(b'd' * 3)
+
+        bodies = [call.kwargs['Body'] for call in self.s3_client.upload_part.call_args_list]
+        self.assertEqual(bodies, [b'a' * 12, b'b' * 4 + b'c' * 8, b'd' * 3])
+        self.s3_client.complete_multipart_upload.assert_called_once_with(
+            Bucket='bucket',
+            Key='key.csv.gz',
+            UploadId='upload-id',
+            MultipartUpload={'Parts': [
+                {'ETag': 'etag-1', 'PartNumber': 1},
+                {'ETag': 'etag-2', 'PartNumber': 2},
+                {'ETag': 'etag-3', 'PartNumber': 3},
+            ]},
+        )
+
+    def test_empty_upload_sends_one_part(self):
+        with lambda_function.S3MultipartWriter(self.s3_client, 'bucket', 'key.csv.gz'):
+            pass
+        self.s3_client.upload_part.assert_called_once_with(
+            Bucket='bucket', Key='key.csv.gz', UploadId='upload-id', PartNumber=1, Body=b''
+        )
+        self.s3_client.complete_multipart_upload.assert_called_once()
+
+    def test_size_limit_aborts(self):
+        with mock.patch.object(lambda_function, 'MAX_GZIP_SIZE', 20):
+            with self.assertRaises(ValueError):
+                with lambda_function.S3MultipartWriter(self.s3_client, 'bucket', 'key.csv.gz') as s3_file:
+                    s3_file.write(b'a' * 15)
+                    s3_file.write(b'b' * 15)
+        self.s3_client.abort_multipart_upload.assert_called_once()
+        self.s3_client.complete_multipart_upload.assert_not_called()
+
+    def test_failed_abort_does_not_mask_error(self):
+        self.s3_client.abort_multipart_upload.side_effect = RuntimeError('AccessDenied')
+        with self.assertRaises(OSError):
+            with lambda_function.S3MultipartWriter(self.s3_client, 'bucket', 'key.csv.gz'):
+                raise OSError('connection reset')
+        self.s3_client.abort_multipart_upload.assert_called_once_with(
+            Bucket='bucket', Key='key.csv.gz', UploadId='upload-id'
+        )
+        self.s3_client.complete_multipart_upload.assert_not_called()
+
+
+class ConnectSftpTest(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.dict(os.environ, ENV):
+            self.processor = lambda_function.FileProcessor()
+        self.processor.clear_secret_cache()
+        self.addCleanup(self.processor.clear_secret_cache)
+
+    def test_rotated_key_is_refetched(self):
+        secrets = mock.Mock()
+        secrets.get_secret_value.side_effect = [
+            {'SecretString': '{"SSH_KEY": "old"}'},
+            {'SecretString': '{"SSH_KEY": "new"}'},
+        ]
+
+        def pool(host, username, pkey, size):
+            if pkey == 'old':
+                raise lambda_function.paramiko.AuthenticationException()
+            return mock.Mock(pkey=pkey)
+
+        def parse_key(file_obj):
+            return file_obj.read()
+
+        with mock.patch.object(lambda_function, '_SECRETS', secrets), \
+                mock.patch.object(lambda_function.paramiko, 'RSAKey', parse_key), \
+                mock.patch.object(lambda_function, 'SftpConnectionPool', pool):
+            self.processor.get_ssh_key()
+            self.processor.connect_sftp()
+
+        self.assertEqual(self.processor.sftp_pool.pkey, 'new')
+        self.assertEqual(secrets.get_secret_value.call_count, 2)
+
+
+class LambdaHandlerTest(unittest.TestCase):
+    def test_partial_pool_growth_is_not_fatal(self):
+        sftp_client = mock.Mock()
+        sftp_client.listdir_attr.return_value = [
+            mock.Mock(filename='20240101_a.csv', st_size=10),
+            mock.Mock(filename='20240101_b.csv', st_size=20),
+        ]
+        pool = mock.Mock(size=1, client=lambda: contextlib.nullcontext(sftp_client))
+        pool.grow.side_effect = OSError('too many sessions')
+
+        with mock.patch.dict(os.environ, ENV), \
+                mock.patch.object(lambda_function, 'SftpConnectionPool', return_value=pool), \
+                mock.patch.object(lambda_function.FileProcessor, 'get_ssh_key', return_value='key'), \
+                mock.patch.object(lambda_function.FileProcessor, 'stream_to_s3') as stream_to_s3:
+            response = lambda_function.lambda_handler({}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(stream_to_s3.call_count, 2)
+        pool.close.assert_called_once_with()
+
+
+class GzipFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmp.name, '20240101_report.csv')
+        self.output_path = self.input_path + '.gz'
+        with mock.patch.dict(os.environ, ENV):
+            self.processor = lambda_function.FileProcessor()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_input(self, data: bytes):
+        with open(self.input_path, 'wb') as f:
+            f.write(data)
+
+    def test_round_trip(self):
+        data = os.urandom(3 * 1024 * 1024) + b'a,b,c\n' * 500000
+        for cpus in (1, 4):
+            with self.subTest(cpus=cpus):
+                self.write_input(data)
+                with mock.patch.object(lambda_function.os, 'cpu_count', return_value=cpus):
+                    self.processor.gzip_file(self.input_path, self.output_path)
+                with gzip.open(self.output_path, 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+    def test_empty_file(self):
+        self.write_input(b'')
+        self.processor.gzip_file(self.input_path, self.output_path)
+        with gzip.open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(), b'')
+
+    def test_error_mid_compression_is_not_masked(self):
+        self.write_input(os.urandom(8 * 1024 * 1024))
+        deflate_block = lambda_function.deflate_block
+        calls = []
+
+        def failing_deflate_block(block, zdict):
+            calls.append(None)
+            if len(calls) == 20:
+                raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+            return deflate_block(block, zdict)
+
+        with mock.patch.object(lambda_function.os, 'cpu_count', return_value=4), \
+                mock.patch.object(lambda_function, 'deflate_block', failing_deflate_block):
+            with self.assertRaises(OSError) as ctx:
+                self.processor.gzip_file(self.input_path, self.output_path)
+        self.assertEqual(ctx.exception.errno, errno.ENOSPC)
+
+    def test_error_mid_compression_single_cpu_is_not_masked(self):
+        self.write_input(os.urandom(8 * 1024 * 1024))
+
+        class FailingOutput:
+            def __init__(self, f):
+                self.f = f
+                self.writes = 0
+
+            def write(self, data):
+                self.writes += 1
+                if self.writes == 2:
+                    raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+                return self.f.write(data)
+
+        real_write_gzip = lambda_function.write_gzip
+
+        def write_gzip(chunks, f_out, filename=''):
+            return real_write_gzip(chunks, FailingOutput(f_out), filename)
+
+        with mock.patch.object(lambda_function.os, 'cpu_count', return_value=1), \
+                mock.patch.object(lambda_function, 'write_gzip', write_gzip):
+            with self.assertRaises(OSError) as ctx:
+                self.processor.gzip_file(self.input_path, self.output_path)
+        self.assertEqual(ctx.exception.errno, errno.ENOSPC)
+
+
+class GroupFilesTest(unittest.TestCase):
+    def test_missing_size(self):
+        with mock.patch.dict(os.environ, ENV):
+            processor = lambda_function.FileProcessor()
+        grouped = processor.group_files([
+            mock.Mock(filename='1_20240101_report.csv', st_size=None),
+            mock.Mock(filename='2_20240101_report.csv', st_size=5),
+            mock.Mock(filename='notes.txt', st_size=1),
+        ])
+        self.assertEqual(list(grouped), ['20240101_report'])
+        self.assertEqual([f['size'] for f in grouped['20240101_report']], [0, 5])
+
+
+class ProcessFileGroupTest(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.dict(os.environ, ENV):
+            self.processor = lambda_function.FileProcessor()
+
+    def test_single_csv_is_streamed(self):
+        file_group = [dict(self.processor.parse_filename('20240101_report.csv'), size=42)]
+        with mock.patch.object(self.processor, 'stream_to_s3') as stream_to_s3:
+            processed = self.processor.process_file_group('20240101_report', file_group)
+        stream_to_s3.assert_called_once_with([('20240101_report.csv', 42)], '20240101_report.csv.gz')
+        self.assertEqual(processed, ['20240101_report.csv.gz'])
+
+    def stream_through_fakes(self, remote_files):
+        class RemoteFile(io.BytesIO):
+            prefetch = mock.Mock()
+
+        uploaded = {}
+
+        def complete_multipart_upload(Key, MultipartUpload, **kwargs):
+            bodies = {call.kwargs['PartNumber']: call.kwargs['Body'] for call in s3_client.upload_part.call_args_list}
+            uploaded[Key] = b''.join(bodies[part['PartNumber']] for part in MultipartUpload['Parts'])
+
+        sftp_client = mock.Mock()
+        sftp_client.open.side_effect = lambda path, mode: RemoteFile(remote_files[path])
+        s3_client = mock.Mock(complete_multipart_upload=complete_multipart_upload)
+        s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-id'}
+        s3_client.upload_part.return_value = {'ETag': 'etag'}
+        self.processor.sftp_pool = mock.Mock(client=lambda: contextlib.nullcontext(sftp_client))
+        self.processor.s3_client = s3_client
+        self.prefetch = RemoteFile.prefetch
+        return sftp_client, uploaded
+
+    def test_stream_to_s3(self):
+        data = os.urandom(100000) + b'a,b,c\n' * 100000
+        _, uploaded = self.stream_through_fakes({'20240101_report.csv': data})
+        self.processor.stream_to_s3([('20240101_report.csv', len(data))], '20240101_report.csv.gz')
+        self.assertEqual(gzip.decompress(uploaded['20240101_report.csv.gz']), data)
+        self.prefetch.assert_called_once_with(
+            file_size=len(data), max_concurrent_requests=lambda_function.SFTP_PREFETCH_REQUESTS
+        )
+
+    def test_multi_part_group_is_streamed_in_name_order(self):
+        remote_files = {
+            '2_20240101_report.csv': b'4,5,6\n',
+            '1_20240101_report.csv': b'a,b,c\n1,2,3\n',
+        }
+        sftp_client, uploaded = self.stream_through_fakes(remote_files)
+        file_group = [
+            dict(self.processor.parse_filename(name), size=len(data))
+            for name, data in remote_files.items()
+        ]
+        processed = self.processor.process_file_group('20240101_report', file_group)
+
+        self.assertEqual(processed, ['20240101_report.csv.gz'])
+        self.assertEqual(
+            [call.args[0] for call in sftp_client.open.call_args_list],
+            ['1_20240101_report.csv', '2_20240101_report.csv'],
+        )
+        self.assertEqual(gzip.decompress(uploaded['20240101_report.csv.gz']), b'a,b,c\n1,2,3\n4,5,6\n')
+
+    def test_zip_group_removes_work_dir(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_ref:
+            zip_ref.writestr('20240101_report', b'a,b\n1,2\n')
+        uploads = {}
+
+        def get(remote_path, local_path, **kwargs):
+            with open(local_path, 'wb') as f:
+                f.write(archive.getvalue())
+
+        def upload_file(local_path, bucket, s3_key, Config=None):
+            with open(local_path, 'rb') as f:
+                uploads[s3_key] = f.read()
+
+        sftp_client = mock.Mock(get=get)
+        self.processor.sftp_pool = mock.Mock(client=lambda: contextlib.nullcontext(sftp_client))
+        self.processor.s3_client = mock.Mock(upload_file=upload_file)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            work_dir = os.path.join(tmp, 'wg0')
+            os.mkdir(work_dir)
+            file_group = [self.processor.parse_filename('20240101_report.zip')]
+            processed = self.processor.process_file_group('20240101_report', file_group, work_dir)
+            self.assertFalse(os.path.exists(work_dir))
+
+        self.assertEqual(processed, ['20240101_report.gz'])
+        self.assertEqual(gzip.decompress(uploads['20240101_report.gz']), b'a,b\n1,2\n')
+
+    def test_zip_group_without_work_dir(self):
+        file_group = [self.processor.parse_filename('20240101_report.zip')]
+        with self.assertRaises(ValueError):
+            self.processor.process_file_group('20240101_report', file_group)
+
+
+if __name__ == '__main__':
+    unittest.main()